@@ -1,87 +1,286 @@
 import pandas as pd
 import numpy as np
 import streamlit as st
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.feather as pa_feather
+import io
+import urllib.request
+import shutil
+import tempfile
+import time
+from pathlib import Path
 from datetime import datetime
 
+URL_DATA = 'https://storage.dosm.gov.my/gdp/gdp_annual_nominal_supply.parquet'
+# 本地磁盘缓存，冷启动时不必重新下载
+CACHE_PATH = Path.home() / '.cache' / 'malaysia_gdp.parquet'
+# 本地缓存的有效期（秒），过期后重新下载，以便拿到统计局发布的新数据
+CACHE_TTL = 24 * 60 * 60
+# 检查本地缓存是否过期的最小间隔（秒），刷新失败时也不会每次交互都重试
+CHECK_INTERVAL = 10 * 60
+# 下载超时（秒），网络不通时不至于一直卡住页面
+DOWNLOAD_TIMEOUT = 30
+# 同时保留在内存中的Arrow表个数（每种列选择/起始日期组合对应一张表）
+MAX_TABLES = 4
+
+def fetch_parquet():
+    """本地缓存不存在或已过期时下载parquet，返回本地路径"""
+    cached = CACHE_PATH.exists()
+    if cached and time.time() - CACHE_PATH.stat().st_mtime <= CACHE_TTL:
+        return CACHE_PATH
+    
+    CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    # 每次下载写入同目录下独立的临时文件，多个会话同时刷新也不会互相覆盖
+    tmp = tempfile.NamedTemporaryFile(dir=CACHE_PATH.parent, suffix='.tmp', delete=False)
+    tmp_path = Path(tmp.name)
+    try:
+        with tmp, urllib.request.urlopen(URL_DATA, timeout=DOWNLOAD_TIMEOUT) as resp:
+            shutil.copyfileobj(resp, tmp)
+        tmp_path.replace(CACHE_PATH)  # 下载完成后再改名，避免留下半个文件
+    except OSError:
+        tmp_path.unlink(missing_ok=True)
+        # 刷新失败时继续使用旧的本地文件，首次下载失败则照常报错
+        if not cached:
+            raise
+    return CACHE_PATH
+
+@st.cache_data(ttl=CHECK_INTERVAL)
+def load_data_version():
+    """本地文件的版本（修改时间），每 CHECK_INTERVAL 秒最多检查一次是否需要重新下载"""
+    return fetch_parquet().stat().st_mtime_ns
+
+@st.cache_data
+def downsample(xs, ys, n=800):
+    """LTTB降采样：保留折线形状，把点数压缩到n个以内"""
+    size = len(ys)
+    if size <= n or n < 3:
+        return xs, ys
+    
+    x = xs.astype('int64').astype(float) if np.issubdtype(xs.dtype, np.datetime64) else xs.astype(float)
+    y = ys.astype(float)
+    
+    # 首尾两点固定保留，中间数据平均分成 n-2 个桶
+    edges = np.linspace(1, size - 1, n - 1).astype(int)
+    counts = np.diff(edges)
+    avg_x = np.add.reduceat(x[1:size - 1], edges[:-1] - 1) / counts
+    avg_y = np.add.reduceat(y[1:size - 1], edges[:-1] - 1) / counts
+    
+    idx = np.empty(n, dtype=np.int64)
+    idx[0], idx[-1] = 0, size - 1
+    a = 0
+    for i in range(n - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # 下一个桶的平均点作为参考点（最后一个桶用终点）
+        cx, cy = (avg_x[i + 1], avg_y[i + 1]) if i + 1 < n - 2 else (x[-1], y[-1])
+        # 选出与上一个选中点、参考点组成三角形面积最大的点
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(np.argmax(area))
+        idx[i + 1] = a
+    
+    return xs[idx], ys[idx]
+
+def show_error(title, e, hint=None):
+    """显示错误提示和调试信息"""
+    st.error(f"❌ {title}: {str(e)}")
+    if hint:
+        st.info(hint)
+    
+    # 显示错误详情用于调试
+    with st.expander("调试信息"):
+        st.code(f"错误类型: {type(e).__name__}")
+        st.code(f"错误信息: {str(e)}")
+
 def main():
     st.set_page_config(page_title="马来西亚GDP数据分析", layout="wide")
     
     st.title("📊 马来西亚GDP数据分析")
     st.write("数据来源：马来西亚统计局 (Department of Statistics Malaysia)")
     
-    # 加载数据
-    @st.cache_data
-    def load_data():
-        URL_DATA = 'https://storage.dosm.gov.my/gdp/gdp_annual_nominal_supply.parquet'
-        df = pd.read_parquet(URL_DATA)
-        
-        # 修复日期列 - 处理纳秒级时间戳
-        if 'date' in df.columns: 
-            # 方法1: 转换为datetime并去掉纳秒部分
-            df['date'] = pd.to_datetime(df['date']).dt.floor('s')  # 去掉纳秒，保留到秒
-            
-            # 方法2: 或者转换为字符串格式显示
-            df['date_str'] = df['date'].dt.strftime('%Y-%m-%d')
-            
-        return df
+    # 只读取parquet文件尾部的schema，用于列选择（按本地文件版本缓存）
+    @st.cache_data(max_entries=1)
+    def load_schema(data_version):
+        return pq.ParquetFile(CACHE_PATH).schema_arrow
     
-    try:
-        df = load_data()
+    # 日期列的最早/最晚日期，作为起始日期选择器的范围（只读日期这一列）
+    @st.cache_data(max_entries=1)
+    def load_date_range(data_version):
+        bounds = pc.min_max(pq.read_table(CACHE_PATH, columns=['date'])['date'])
+        first, last = bounds['min'].as_py(), bounds['max'].as_py()
+        return (first.date(), last.date()) if first is not None else (None, None)
+    
+    # 加载数据（只读选中的列，日期条件下推到行组过滤）
+    # 以Arrow表的形式放进 cache_resource：所有会话共享同一份，不做序列化
+    @st.cache_resource(max_entries=MAX_TABLES)
+    def load_table(columns=None, filters=None, data_version=None):
+        # 内存映射读取本地文件，多进程可共享系统页缓存
+        table = pq.read_table(
+            CACHE_PATH,
+            columns=columns,
+            filters=filters,
+            use_threads=True,
+            memory_map=True
+        )
         
-        st.success(f"✅ 数据加载成功！共 {len(df)} 行数据")
+        # 修复日期列 - 读取时直接转换为秒级时间戳，去掉纳秒部分
+        if 'date' in table.column_names:
+            date_idx = table.schema.get_field_index('date')
+            table = table.set_column(date_idx, 'date', pc.cast(table['date'], pa.timestamp('s'), safe=False))
+            # 加载时按日期排序一次（稳定排序），图表直接复用
+            table = table.sort_by('date')
         
-        # 使用tabs组织内容
-        tab1, tab2, tab3, tab4 = st.tabs(["📋 数据预览", "📊 数据分析", "📈 可视化", "💾 数据下载"])
+        # 列类型在加载时识别一次（只需要schema对应的空表）
+        dtypes = table.schema.empty_table().to_pandas(types_mapper=pd.ArrowDtype).dtypes
+        numeric_cols = [c for c, dtype in dtypes.items() if pd.api.types.is_numeric_dtype(dtype)]
+        # select_dtypes('datetime64') 识别不到Arrow时间戳，按dtype逐个判断
+        date_cols = [c for c, dtype in dtypes.items() if pd.api.types.is_datetime64_any_dtype(dtype)]
+        str_cols = [c for c, dtype in dtypes.items() if pd.api.types.is_string_dtype(dtype)]
         
-        with tab1:
+        return table, numeric_cols, date_cols, str_cols
+    
+    # 以下缓存都按表的加载参数 table_key=(columns, filters, data_version) 作键，_table 本身不参与哈希；
+    # 表被淘汰后 id 可能被新表复用，不能再用 id(table) 作键
+    
+    # 下载文件只生成一次，之后重复渲染直接复用字节
+    @st.cache_data(max_entries=2)
+    def to_csv_bytes(table_key, _table, date_format=None):
+        table = _table
+        if date_format and 'date' in table.column_names:
+            # 只在写出下载文件时格式化日期，不在主数据上保留字符串列
+            date_idx = table.schema.get_field_index('date')
+            table = table.set_column(date_idx, 'date', pc.strftime(table['date'], format=date_format))
+        sink = io.BytesIO()
+        pa_csv.write_csv(
+            table,
+            sink,
+            pa_csv.WriteOptions(include_header=True, delimiter=',')
+        )
+        return sink.getvalue()
+    
+    @st.cache_data(max_entries=1)
+    def to_parquet_bytes(table_key, _table):
+        sink = io.BytesIO()
+        pq.write_table(_table, sink, compression='zstd', use_dictionary=True)
+        return sink.getvalue()
+    
+    @st.cache_data(max_entries=1)
+    def to_feather_bytes(table_key, _table):
+        sink = io.BytesIO()
+        pa_feather.write_feather(_table, sink, compression='zstd', compression_level=3)
+        return sink.getvalue()
+    
+    # 绘图数据以NumPy数组分开缓存（SoA），日期数组在各数值列之间共用
+    @st.cache_data(max_entries=MAX_TABLES)
+    def load_dates(table_key, _table):
+        return _table['date'].to_numpy()
+    
+    @st.cache_data(max_entries=MAX_TABLES * 8)
+    def load_values(table_key, _table, col):
+        return _table[col].to_numpy().astype(float)
+    
+    # 平均值/中位数/总和合并成一次聚合，按列缓存
+    @st.cache_data(max_entries=MAX_TABLES * 8)
+    def load_col_stats(table_key, _table, col):
+        return _table[col].to_pandas(types_mapper=pd.ArrowDtype).agg(['mean', 'median', 'sum']).tolist()
+    
+    # 统计信息只计算一次，之后每次交互直接读取缓存
+    @st.cache_data(max_entries=MAX_TABLES)
+    def compute_stats(table_key, _table, numeric_cols, date_cols):
+        df = _table.to_pandas(types_mapper=pd.ArrowDtype)
+        return {
+            'missing': df.isnull().sum(),
+            'dtype_counts': df.dtypes.astype(str).value_counts(),
+            'describe': df[numeric_cols].describe() if numeric_cols else None,
+            # 所有日期列的 min/max/nunique 合并成一次聚合，每行对应一个日期列
+            'date_stats': df[date_cols].agg(['min', 'max', 'nunique']).T if date_cols else None
+        }
+    
+    # 每列只转换一次Arrow字符串数组，搜索时直接复用
+    @st.cache_resource(max_entries=MAX_TABLES)
+    def load_search_cols(table_key, _table, str_cols):
+        return {
+            col: _table[col] if col in str_cols else pc.cast(_table[col], pa.string())
+            for col in _table.column_names
+        }
+    
+    # 各标签页是fragment：页内出错不会以原始类型传到main的except，
+    # 且只重新运行本页时main的except根本不执行，所以每页自己捕获并显示错误
+    
+    # 数据预览标签页（fragment：本页控件变化时只重新运行本页）
+    @st.fragment
+    def render_tab1(df, table, table_key, str_cols):
+        try:
+            n_rows = table.num_rows
             st.subheader("完整数据预览")
             
             # 显示列信息
             st.write("**数据列:**")
+            # 先按列分组拼好文本，每个分栏只写一次
+            chunks = [[] for _ in range(4)]
+            for i, (name, dtype) in enumerate(df.dtypes.items()):
+                chunks[i % 4].append(f"• {name} ({dtype})")
             cols = st.columns(4)
-            for i, col in enumerate(df.columns):
-                cols[i % 4].write(f"• {col} ({df[col].dtype})")
+            for col, chunk in zip(cols, chunks):
+                col.markdown("  \n".join(chunk))
             
             # 搜索和筛选
             st.subheader("数据搜索和筛选")
-            search_term = st.text_input("搜索关键词（在日期列中搜索）:", placeholder="例如: 2020, Q1, 等")
+            search_term = st.text_input("搜索关键词（在日期列中搜索）:", placeholder="例如: 2020, Q1, 等", key="search_term")
             
             if search_term:
-                mask = df.apply(lambda row: row.astype(str).str.contains(search_term, case=False, na=False).any(), axis=1)
+                # 逐列用Arrow的子串匹配内核直接扫描字符串缓冲区，结果压成位图（每字节8行）
+                packed = [
+                    np.packbits(pc.match_substring(arr, search_term, ignore_case=True).fill_null(False).to_numpy(zero_copy_only=False))
+                    for arr in load_search_cols(table_key, table, str_cols).values()
+                ]
+                # 所有列的位图一次按位或合并，再展开回布尔掩码
+                if packed:
+                    mask = np.unpackbits(np.bitwise_or.reduce(np.stack(packed), axis=0), count=n_rows).astype(bool)
+                else:
+                    mask = np.zeros(n_rows, dtype=bool)
                 filtered_df = df[mask]
                 st.write(f"找到 {len(filtered_df)} 条匹配记录")
                 st.dataframe(filtered_df, use_container_width=True)
             else:
                 # 分页显示数据
-                page_size = st.slider("每页显示行数:", min_value=10, max_value=100, value=20)
-                total_pages = max(1, len(df) // page_size)
-                page = st.number_input("页码:", min_value=1, max_value=total_pages, value=1)
+                page_size = st.slider("每页显示行数:", min_value=10, max_value=100, value=20, key="page_size")
+                total_pages = max(1, -(-n_rows // page_size))  # 向上取整，保留最后不满一页的数据
+                page = st.number_input("页码:", min_value=1, max_value=total_pages, value=1, key="page")
                 
                 start_idx = (page - 1) * page_size
-                end_idx = min(start_idx + page_size, len(df))
+                end_idx = min(start_idx + page_size, n_rows)
                 
-                st.write(f"显示第 {start_idx + 1} 到 {end_idx} 行 (共 {len(df)} 行)")
-                st.dataframe(df.iloc[start_idx:end_idx], use_container_width=True)
-        
-        with tab2:
+                st.write(f"显示第 {start_idx + 1} 到 {end_idx} 行 (共 {n_rows} 行)")
+                # Arrow零拷贝切片，行号仍按全表位置显示
+                page_df = table.slice(start_idx, page_size).to_pandas(types_mapper=pd.ArrowDtype)
+                st.dataframe(page_df.set_axis(range(start_idx, end_idx)), use_container_width=True)
+        except Exception as e:
+            show_error("显示本页时出错", e)
+    
+    # 数据分析标签页（fragment：本页控件变化时只重新运行本页）
+    @st.fragment
+    def render_tab2(table, table_key, numeric_cols, date_cols):
+        try:
             st.subheader("数据统计信息")
             
+            stats = compute_stats(table_key, table, numeric_cols, date_cols)
             col1, col2 = st.columns(2)
             
             with col1:
                 st.write("**数据基本信息:**")
-                st.metric("总行数", len(df))
-                st.metric("总列数", len(df.columns))
+                st.metric("总行数", table.num_rows)
+                st.metric("总列数", table.num_columns)
                 
                 # 显示数据类型分布
                 st.write("**数据类型分布:**")
-                dtype_counts = df.dtypes.value_counts()
-                for dtype, count in dtype_counts.items():
+                for dtype, count in stats['dtype_counts'].items():
                     st.write(f"- {dtype}: {count}")
             
             with col2:
                 st.write("**缺失值统计:**")
-                missing_df = df.isnull().sum().reset_index()
+                missing_df = stats['missing'].reset_index()
                 missing_df.columns = ['列名', '缺失值数量']
                 missing_df = missing_df[missing_df['缺失值数量'] > 0]
                 
@@ -91,77 +290,100 @@ def main():
                     st.success("✅ 没有缺失值")
             
             # 数值列统计
-            numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
-            if numeric_cols:
+            if stats['describe'] is not None:
                 st.subheader("数值列统计摘要")
-                st.dataframe(df[numeric_cols].describe(), use_container_width=True)
+                st.dataframe(stats['describe'], use_container_width=True)
             
             # 日期列信息
-            date_cols = df.select_dtypes(include=['datetime64']).columns.tolist()
-            if date_cols:
+            if stats['date_stats'] is not None:
                 st.subheader("日期列信息")
-                for date_col in date_cols:
+                for date_col, date_stats in stats['date_stats'].iterrows():
                     col1, col2 = st.columns(2)
                     with col1:
                         st.write(f"**{date_col}**:")
-                        st.write(f"- 最早: {df[date_col].min().date()}")
-                        st.write(f"- 最晚: {df[date_col].max().date()}")
-                        st.write(f"- 唯一值数量: {df[date_col].nunique()}")
-        
-        with tab3:
+                        # Arrow后端的空日期列 min/max 返回 pd.NA（不是NaT），没有 .date()
+                        earliest, latest = date_stats['min'], date_stats['max']
+                        st.write(f"- 最早: {'无' if pd.isna(earliest) else earliest.date()}")
+                        st.write(f"- 最晚: {'无' if pd.isna(latest) else latest.date()}")
+                        st.write(f"- 唯一值数量: {date_stats['nunique']}")
+        except Exception as e:
+            show_error("显示本页时出错", e)
+    
+    # 可视化标签页（fragment：本页控件变化时只重新运行本页）
+    @st.fragment
+    def render_tab3(table, table_key, numeric_cols):
+        try:
             st.subheader("数据可视化")
             
             # 检查是否有数值列可以绘图
-            numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
-            
-            if numeric_cols and 'date' in df.columns:
+            if numeric_cols and 'date' in table.column_names:
                 st.write("**时间序列图**")
                 
-                selected_col = st.selectbox("选择要可视化的数值列:", numeric_cols)
+                selected_col = st.selectbox("选择要可视化的数值列:", numeric_cols, key="chart_col")
                 
                 if selected_col:
-                    # 按日期排序
-                    plot_df = df.sort_values('date')
+                    # 数据在加载时已按日期排序，降采样后再绘图，数据量再大也只传输固定数量的点
+                    xs, ys = load_dates(table_key, table), load_values(table_key, table, selected_col)
+                    valid = ~(np.isnat(xs) | np.isnan(ys))
+                    xs, ys = downsample(xs[valid], ys[valid])
                     
                     # 创建简单的折线图
                     st.line_chart(
-                        plot_df.set_index('date')[selected_col],
+                        {'date': xs, selected_col: ys},
+                        x='date',
+                        y=selected_col,
                         use_container_width=True
                     )
                     
                     # 显示统计数据
+                    mean_value, median_value, sum_value = load_col_stats(table_key, table, selected_col)
                     col1, col2, col3 = st.columns(3)
                     with col1:
-                        st.metric(f"{selected_col} 平均值", f"{plot_df[selected_col].mean():,.2f}")
+                        st.metric(f"{selected_col} 平均值", f"{mean_value:,.2f}")
                     with col2:
-                        st.metric(f"{selected_col} 中位数", f"{plot_df[selected_col].median():,.2f}")
+                        st.metric(f"{selected_col} 中位数", f"{median_value:,.2f}")
                     with col3:
-                        st.metric(f"{selected_col} 总和", f"{plot_df[selected_col].sum():,.2f}")
+                        st.metric(f"{selected_col} 总和", f"{sum_value:,.2f}")
             else:
                 st.info("没有足够的数据进行可视化（需要日期列和数值列）")
-        
-        with tab4:
+        except Exception as e:
+            show_error("显示本页时出错", e)
+    
+    # 数据下载标签页（fragment：本页控件变化时只重新运行本页）
+    @st.fragment
+    def render_tab4(df, table, table_key):
+        try:
             st.subheader("数据下载")
             
             st.write("**下载选项:**")
             
-            # 下载完整数据
-            csv = df.to_csv(index=False).encode('utf-8')
+            # 下载完整数据 - 列式压缩格式体积远小于CSV，且保留时间戳类型
+            download_format = st.radio(
+                "文件格式:",
+                ["Parquet (ZSTD)", "Arrow/Feather (ZSTD)", "CSV"],
+                horizontal=True,
+                key="download_format"
+            )
+            if download_format == "CSV":
+                data, file_name, mime = to_csv_bytes(table_key, table), "malaysia_gdp_full_data.csv", "text/csv"
+            elif download_format == "Arrow/Feather (ZSTD)":
+                data, file_name, mime = to_feather_bytes(table_key, table), "malaysia_gdp_full_data.feather", "application/octet-stream"
+            else:
+                data, file_name, mime = to_parquet_bytes(table_key, table), "malaysia_gdp_full_data.parquet", "application/octet-stream"
+            
             st.download_button(
-                label="📥 下载完整数据 (CSV)",
-                data=csv,
-                file_name="malaysia_gdp_full_data.csv",
-                mime="text/csv",
+                label=f"📥 下载完整数据 ({download_format})",
+                data=data,
+                file_name=file_name,
+                mime=mime,
                 use_container_width=True
             )
             
             # 下载处理后的数据（不含纳秒时间戳）
-            if 'date_str' in df.columns:
-                clean_df = df.copy()
-                clean_csv = clean_df.to_csv(index=False).encode('utf-8')
+            if 'date' in table.column_names:
                 st.download_button(
                     label="📥 下载简化数据 (CSV，日期格式简化)",
-                    data=clean_csv,
+                    data=to_csv_bytes(table_key, table, date_format='%Y-%m-%d'),
                     file_name="malaysia_gdp_simplified.csv",
                     mime="text/csv",
                     use_container_width=True
@@ -172,15 +394,54 @@ def main():
             # 数据预览
             st.write("**数据预览（前10行）:**")
             st.dataframe(df.head(10), use_container_width=True)
+        except Exception as e:
+            show_error("显示本页时出错", e)
     
-    except Exception as e:
-        st.error(f"❌ 加载数据时出错: {str(e)}")
-        st.info("💡 请检查网络连接或稍后重试")
+    try:
+        # 文件更新后修改时间变化，相关缓存随之失效
+        data_version = load_data_version()
+        schema = load_schema(data_version)
+        
+        # 侧边栏 - 数据加载设置
+        with st.sidebar:
+            st.header("⚙️ 数据加载设置")
+            selected_cols = st.multiselect("加载的列:", schema.names, default=schema.names)
+            if 'date' in schema.names:
+                # 不指定范围时选择器只允许今天前后10年，按数据实际的日期范围设置
+                min_date, max_date = load_date_range(data_version)
+                start_date = st.date_input("起始日期（可选）:", value=None, min_value=min_date, max_value=max_date)
+            else:
+                start_date = None
+        
+        columns = list(selected_cols)
+        if 'date' in schema.names and 'date' not in columns:
+            columns.insert(0, 'date')  # 日期列始终需要
+        filters = [('date', '>=', datetime.combine(start_date, datetime.min.time()))] if start_date else None
+        
+        table_key = (columns, filters, data_version)
+        table, numeric_cols, date_cols, str_cols = load_table(*table_key)
+        # 每个会话从共享的Arrow表构建pandas视图（Arrow后端dtype，不复制数据）
+        df = table.to_pandas(types_mapper=pd.ArrowDtype)
+        
+        st.success(f"✅ 数据加载成功！共 {table.num_rows} 行数据")
+        
+        # 使用tabs组织内容
+        tab1, tab2, tab3, tab4 = st.tabs(["📋 数据预览", "📊 数据分析", "📈 可视化", "💾 数据下载"])
+        
+        with tab1:
+            render_tab1(df, table, table_key, str_cols)
+        
+        with tab2:
+            render_tab2(table, table_key, numeric_cols, date_cols)
+        
+        with tab3:
+            render_tab3(table, table_key, numeric_cols)
         
-        # 显示错误详情用于调试
-        with st.expander("调试信息"):
-            st.code(f"错误类型: {type(e).__name__}")
-            st.code(f"错误信息: {str(e)}")
+        with tab4:
+            render_tab4(df, table, table_key)
+    
+    except Exception as e:
+        show_error("加载数据时出错", e, hint="💡 请检查网络连接或稍后重试")
 
 if __name__ == "__main__":
     main()
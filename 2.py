@@ -3,11 +3,33 @@ import numpy as np
 import streamlit as st
 import plotly.graph_objects as go
 import plotly.express as px
+import plotly.io as pio
+import pyarrow as pa
+import pyarrow.parquet as pq
+import urllib.request
 from datetime import datetime
+from functools import lru_cache
+
+# 图表序列化改用orjson（C实现，大图表明显更快）；未安装时保持plotly默认引擎
+try:
+    import orjson  # noqa: F401
+    pio.json.config.default_engine = 'orjson'
+except ImportError:
+    pass
+
+# 深色图表的公共布局和网格线样式，各图表共用同一份常量。
+# 必须作为图表自身的layout属性设置：st.plotly_chart默认的streamlit主题会覆盖模板里的这些值
+DARK_LAYOUT = dict(
+    plot_bgcolor='#1e2130',
+    paper_bgcolor='#1e2130',
+    font=dict(color='white')
+)
+GRID_AXIS = dict(showgrid=True, gridwidth=1, gridcolor='#3a3a4a')
 
 # 颜色方案映射函数 - 放在函数外部或确保在调用前定义
+@lru_cache(maxsize=8)
 def get_color_scheme(scheme_name):
-    """获取颜色方案"""
+    """获取颜色方案（按名称缓存，返回同一个元组）"""
     schemes = {
         "Plotly默认": px.colors.qualitative.Plotly,
         "Viridis": px.colors.sequential.Viridis,
@@ -18,7 +40,340 @@ def get_color_scheme(scheme_name):
         "平衡色": ['#2E91E5', '#E15F99', '#1CA71C', '#FB0D0D', '#DA16FF', 
                   '#222A2A', '#B68100', '#750D86', '#EB663B', '#511CFB']
     }
-    return schemes.get(scheme_name, px.colors.qualitative.Plotly)
+    return tuple(schemes.get(scheme_name, px.colors.qualitative.Plotly))
+
+# 优化CSS - 深色背景上的白色文字
+CUSTOM_CSS = """
+<style>
+.stApp {
+    background-color: #0e1117;
+}
+.main-header {
+    font-size: 2.5rem;
+    color: #ffffff;
+    text-align: center;
+    margin-bottom: 1rem;
+    font-weight: bold;
+}
+.section-header {
+    color: #ffffff;
+    font-size: 1.5rem;
+    margin-top: 1.5rem;
+    margin-bottom: 1rem;
+}
+.chart-card {
+    background-color: #262730;
+    padding: 20px;
+    border-radius: 10px;
+    margin-bottom: 20px;
+    border: 1px solid #3a3a4a;
+}
+[data-testid="stMetric"] {
+    background-color: #1e2130;
+    padding: 15px;
+    border-radius: 8px;
+    border-left: 4px solid #4cc9f0;
+    margin-bottom: 10px;
+}
+.stSelectbox > div > div {
+    background-color: #262730;
+    color: white;
+}
+.stSelectbox label {
+    color: #ffffff !important;
+}
+.stSlider label {
+    color: #ffffff !important;
+}
+.stCheckbox label {
+    color: #ffffff !important;
+}
+.stRadio label {
+    color: #ffffff !important;
+}
+.info-text {
+    color: #a0a0c0;
+    font-size: 0.9rem;
+    margin-top: 5px;
+}
+</style>
+"""
+
+@st.cache_resource
+def inject_css():
+    """注入自定义样式（只构建一次，重新运行时由缓存回放）"""
+    st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
+    return True
+
+# 图表构建函数 - 按图表配置缓存，配置未变时直接复用上次生成的图表
+@st.cache_data
+def build_timeseries_fig(agg_year, metrics, year_range, colors, show_grid, show_legend, unified_hover):
+    """构建时间序列趋势图，所选年份范围内无数据时返回None"""
+    # 筛选数据（直接取预先聚合好的年度均值）
+    filtered_agg = agg_year.loc[year_range[0]:year_range[1]]
+    if filtered_agg.empty:
+        return None
+    
+    fig = go.Figure()
+    
+    # 所选指标的年度均值一次性取成 年份×指标 的NumPy矩阵，不再逐个指标取列
+    years = filtered_agg.index.to_numpy()
+    yearly_means = filtered_agg.loc[:, [(metric, 'mean') for metric in metrics]].to_numpy()
+    
+    for i, metric in enumerate(metrics):
+        # WebGL渲染，点数多时比SVG快得多
+        fig.add_trace(go.Scattergl(
+            x=years,
+            y=yearly_means[:, i],
+            mode='lines+markers',
+            name=metric,
+            line=dict(width=3, color=colors[i % len(colors)]),
+            marker=dict(size=6)
+        ))
+    
+    # 更新布局
+    fig.update_layout(
+        title=f"{year_range[0]}-{year_range[1]}年趋势分析",
+        xaxis_title="年份",
+        yaxis_title="数值",
+        showlegend=show_legend,
+        hovermode='x unified' if unified_hover else 'closest',
+        **DARK_LAYOUT
+    )
+    
+    if show_grid:
+        fig.update_xaxes(**GRID_AXIS, zerolinecolor='#3a3a4a')
+        fig.update_yaxes(**GRID_AXIS, zerolinecolor='#3a3a4a')
+    else:
+        fig.update_xaxes(showgrid=False, zeroline=False)
+        fig.update_yaxes(showgrid=False, zeroline=False)
+    
+    return fig
+
+@st.cache_data
+def build_bar_fig(agg_year, metric, comparison_years, colors, show_grid, show_legend):
+    """构建年度对比柱状图，所选年份无数据时返回None"""
+    # 筛选数据（按年份查预先聚合好的均值）
+    comparison_data = []
+    for year in comparison_years:
+        if year in agg_year.index:
+            comparison_data.append({
+                '年份': str(year),
+                '数值': agg_year.at[year, (metric, 'mean')]
+            })
+    
+    if not comparison_data:
+        return None
+    
+    comp_df = pd.DataFrame(comparison_data)
+    
+    fig = px.bar(
+        comp_df,
+        x='年份',
+        y='数值',
+        color='年份',
+        title=f"{metric} 年度对比",
+        color_discrete_sequence=colors,
+        text='数值'
+    )
+    
+    fig.update_traces(
+        texttemplate='%{text:,.0f}',
+        textposition='outside',
+        marker_line_width=1,
+        marker_line_color='white'
+    )
+    
+    fig.update_layout(showlegend=show_legend, **DARK_LAYOUT)
+    
+    if show_grid:
+        fig.update_xaxes(**GRID_AXIS)
+        fig.update_yaxes(**GRID_AXIS)
+    
+    return fig
+
+@st.cache_data
+def build_pie_fig(agg_year, metric, recent_years, num_years, colors, show_legend):
+    """构建多年度占比饼图，可用年份少于2年时返回None"""
+    pie_data = []
+    
+    for year in recent_years:
+        if year in agg_year.index:
+            pie_data.append({
+                '年份': str(year),
+                '数值': agg_year.at[year, (metric, 'sum')]
+            })
+    
+    if len(pie_data) < 2:
+        return None
+    
+    pie_df = pd.DataFrame(pie_data)
+    
+    fig = px.pie(
+        pie_df,
+        values='数值',
+        names='年份',
+        title=f"{metric} - 最近{num_years}年占比分布",
+        color_discrete_sequence=colors,
+        hole=0.3  # 环形图
+    )
+    
+    fig.update_traces(
+        textposition='inside',
+        textinfo='percent+label',
+        textfont_size=14,
+        marker=dict(line=dict(color='white', width=2))
+    )
+    
+    fig.update_layout(
+        showlegend=show_legend,
+        legend=dict(
+            font=dict(size=12, color='white')
+        ),
+        **DARK_LAYOUT
+    )
+    
+    return fig
+
+@st.cache_data
+def build_heatmap_fig(agg_year, metric, start_year, end_year, colors):
+    """构建热力图，所选年份无数据时返回None"""
+    # 创建热力图数据
+    means = agg_year.loc[start_year:end_year, (metric, 'mean')]
+    if means.empty:
+        return None
+    
+    # 假设4个季度：年度均值 × 季度系数 (0.85/0.90/0.95/1.00)
+    # 这里简化处理，实际应用中可能需要真实的季度数据
+    scales = 0.8 + 0.2 * (np.arange(1, 5) / 4)
+    # 年度均值与季度系数做一次外积，代替逐年逐季度的循环
+    heatmap_df = pd.DataFrame(
+        means.to_numpy()[:, None] * scales[None, :],
+        index=means.index.rename('年份'),
+        columns=pd.Index([f'Q{period}' for period in range(1, 5)], name='时期')
+    ).stack().rename('数值').reset_index()
+    
+    fig = px.density_heatmap(
+        heatmap_df,
+        x='时期',
+        y='年份',
+        z='数值',
+        title=f"{metric} - {start_year}-{end_year}年热力图",
+        color_continuous_scale=colors,
+        text_auto='.0f'
+    )
+    
+    fig.update_layout(**DARK_LAYOUT)
+    
+    return fig
+
+# 散点图最多绘制的点数
+SCATTER_MAX_POINTS = 5000
+
+@st.cache_data
+def build_scatter_fig(scatter_df, x_metric, y_metric, color_by, colors, show_grid, show_legend):
+    """构建相关性散点图（含OLS趋势线和相关系数）"""
+    # 点数过多时只抽样绘制，趋势线和相关系数仍按全量数据计算
+    if len(scatter_df) > SCATTER_MAX_POINTS:
+        plot_df = scatter_df.sample(SCATTER_MAX_POINTS, random_state=0)
+    else:
+        plot_df = scatter_df
+    
+    if color_by == "无":
+        fig = px.scatter(
+            plot_df,
+            x=x_metric,
+            y=y_metric,
+            title=f"{x_metric} vs {y_metric} 相关性分析",
+            render_mode='webgl',
+            color_discrete_sequence=[colors[0]]
+        )
+    elif color_by == "年份":
+        fig = px.scatter(
+            plot_df,
+            x=x_metric,
+            y=y_metric,
+            color=plot_df['year'].astype('category'),  # 年份按离散类别着色
+            title=f"{x_metric} vs {y_metric} 相关性分析（按年份）",
+            render_mode='webgl',
+            color_discrete_sequence=colors
+        )
+    else:
+        fig = px.scatter(
+            plot_df,
+            x=x_metric,
+            y=y_metric,
+            color=color_by,
+            title=f"{x_metric} vs {y_metric} 相关性分析（按{color_by}）",
+            render_mode='webgl',
+            color_continuous_scale=colors
+        )
+    
+    # 用NumPy直接做一次最小二乘拟合作为趋势线（不再经过statsmodels）
+    x_values = scatter_df[x_metric].to_numpy(dtype=float)
+    slope, intercept = np.polyfit(x_values, scatter_df[y_metric].to_numpy(dtype=float), 1)
+    x_min, x_max = x_values.min(), x_values.max()
+    fig.add_trace(go.Scattergl(
+        x=[x_min, x_max],
+        y=[slope * x_min + intercept, slope * x_max + intercept],
+        mode='lines',
+        name='OLS',
+        line=dict(color='white', width=2, dash='dash')
+    ))
+    
+    # 计算相关系数
+    correlation = scatter_df[x_metric].corr(scatter_df[y_metric])
+    
+    fig.update_layout(
+        showlegend=show_legend,
+        title=f"{fig.layout.title.text}<br><sup>相关系数: {correlation:.3f}</sup>",
+        **DARK_LAYOUT
+    )
+    
+    if show_grid:
+        fig.update_xaxes(**GRID_AXIS)
+        fig.update_yaxes(**GRID_AXIS)
+    
+    return fig
+
+@st.cache_data
+def build_stacked_area_fig(agg_year, metrics, year_range, colors, show_grid, show_legend, unified_hover):
+    """构建堆叠面积图，所选年份范围内无数据时返回None"""
+    filtered_agg = agg_year.loc[year_range[0]:year_range[1]]
+    if filtered_agg.empty:
+        return None
+    
+    fig = go.Figure()
+    
+    # 为堆叠面积图准备数据（预先聚合好的年度均值，一次性取成 年份×指标 矩阵）
+    years = filtered_agg.index.to_numpy()
+    yearly_means = filtered_agg.loc[:, [(metric, 'mean') for metric in metrics]].to_numpy()
+    
+    for i, metric in enumerate(metrics):
+        fig.add_trace(go.Scatter(
+            x=years,
+            y=yearly_means[:, i],
+            mode='lines',
+            name=metric,
+            stackgroup='one',  # 关键参数：堆叠（Scattergl不支持stackgroup，这里保留SVG）
+            line=dict(width=0.5, color=colors[i % len(colors)]),
+            fillcolor=colors[i % len(colors)]
+        ))
+    
+    fig.update_layout(
+        title=f"{year_range[0]}-{year_range[1]}年指标堆叠分布",
+        xaxis_title="年份",
+        yaxis_title="数值",
+        showlegend=show_legend,
+        hovermode='x unified' if unified_hover else 'closest',
+        **DARK_LAYOUT
+    )
+    
+    if show_grid:
+        fig.update_xaxes(**GRID_AXIS)
+        fig.update_yaxes(**GRID_AXIS)
+    
+    return fig
 
 def main():
     st.set_page_config(
@@ -27,85 +382,69 @@ def main():
         layout="wide"
     )
     
-    # 优化CSS - 深色背景上的白色文字
-    st.markdown("""
-    <style>
-    .stApp {
-        background-color: #0e1117;
-    }
-    .main-header {
-        font-size: 2.5rem;
-        color: #ffffff;
-        text-align: center;
-        margin-bottom: 1rem;
-        font-weight: bold;
-    }
-    .section-header {
-        color: #ffffff;
-        font-size: 1.5rem;
-        margin-top: 1.5rem;
-        margin-bottom: 1rem;
-    }
-    .chart-card {
-        background-color: #262730;
-        padding: 20px;
-        border-radius: 10px;
-        margin-bottom: 20px;
-        border: 1px solid #3a3a4a;
-    }
-    .metric-card {
-        background-color: #1e2130;
-        padding: 15px;
-        border-radius: 8px;
-        border-left: 4px solid #4cc9f0;
-        margin-bottom: 10px;
-    }
-    .stSelectbox > div > div {
-        background-color: #262730;
-        color: white;
-    }
-    .stSelectbox label {
-        color: #ffffff !important;
-    }
-    .stSlider label {
-        color: #ffffff !important;
-    }
-    .stCheckbox label {
-        color: #ffffff !important;
-    }
-    .stRadio label {
-        color: #ffffff !important;
-    }
-    .info-text {
-        color: #a0a0c0;
-        font-size: 0.9rem;
-        margin-top: 5px;
-    }
-    </style>
-    """, unsafe_allow_html=True)
+    inject_css()
     
     st.markdown('<h1 class="main-header">📊 马来西亚GDP数据可视化仪表板</h1>', unsafe_allow_html=True)
     
+    URL_DATA = 'https://storage.dosm.gov.my/gdp/gdp_annual_nominal_supply.parquet'
+    
+    # 原始parquet字节只下载一次，读取schema和读取数据共用同一份缓冲区
+    @st.cache_resource
+    def load_parquet_buffer():
+        with urllib.request.urlopen(URL_DATA) as resp:
+            return pa.py_buffer(resp.read())
+    
+    # 从schema中找出日期列和数值列，只读取需要的列
+    @st.cache_resource
+    def load_needed_columns():
+        schema = pq.read_schema(pa.BufferReader(load_parquet_buffer()))
+        return [field.name for field in schema
+                if field.name == 'date'
+                or pa.types.is_integer(field.type)
+                or pa.types.is_floating(field.type)
+                or pa.types.is_decimal(field.type)]
+    
     # 加载数据函数
     @st.cache_data
     def load_data():
-        URL_DATA = 'https://storage.dosm.gov.my/gdp/gdp_annual_nominal_supply.parquet'
         try:
-            df = pd.read_parquet(URL_DATA)
+            # pyarrow引擎 + 列投影 + Arrow类型后端，省去无用列和object类型的开销
+            df = pd.read_parquet(
+                pa.BufferReader(load_parquet_buffer()),
+                engine='pyarrow',
+                columns=load_needed_columns(),
+                dtype_backend='pyarrow'
+            )
             
             # 处理日期列
             if 'date' in df.columns:
                 df['date'] = pd.to_datetime(df['date'])
-                df['year'] = df['date'].dt.year
-                df['year_str'] = df['year'].astype(str)
+                df = df.dropna(subset=['date'])  # 日期缺失的行本来也会被下面的年份筛选排除
+                # 年份用int16，显著减少内存，筛选也更快
+                df['year'] = df['date'].dt.year.astype('int16')
+                
+                # 按年份排序并设为索引，年份范围筛选变成有序索引上的二分查找
+                df = df.sort_values('year', kind='stable').set_index('year', drop=False)
                 
                 # 只保留有意义的年份数据
-                df = df[df['year'] >= 2000]  # 只保留2000年后的数据
+                df = df.loc[2000:]  # 只保留2000年后的数据
+            
+            # 获取数值列（排除年份列），随数据一起缓存；读入的列已按schema投影过，直接检查各列类型即可
+            numeric_cols = [col for col in df.columns
+                            if col != 'year' and pd.api.types.is_numeric_dtype(df[col])]
+            
+            # 按年份预先聚合（均值和总和），图表直接按年份查表，不再反复扫描全表
+            agg_year = None
+            years = []
+            if 'year' in df.columns:
+                agg_year = df.groupby(level='year', sort=True)[numeric_cols].agg(['mean', 'sum'])
+                agg_year = agg_year.astype('float64')  # 聚合表很小，转回float64，缺失值保持为NaN
+                years = agg_year.index.tolist()  # 聚合结果的索引即为排好序的年份
                 
-            return df
+            return df, agg_year, numeric_cols, years
         except Exception as e:
             st.error(f"数据加载失败: {str(e)}")
-            return pd.DataFrame()
+            return pd.DataFrame(), None, [], []
     
     # 侧边栏 - 配置面板
     with st.sidebar:
@@ -148,6 +487,9 @@ def main():
         with col2:
             show_legend = st.checkbox("图例", value=True)
         
+        # 统一悬停在数据点多时每次移动鼠标都要重算所有曲线，默认关闭
+        unified_hover = st.checkbox("统一悬停 (慢)", value=False)
+        
         st.divider()
         
         # 数据信息
@@ -162,23 +504,18 @@ def main():
     
     # 加载数据
     with st.spinner('正在加载数据...'):
-        df = load_data()
+        df, agg_year, numeric_cols, years = load_data()
     
     if df.empty:
         st.error("无法加载数据，请检查网络连接或数据源。")
         return
     
-    # 获取数值列（排除年份列）
-    numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
-    numeric_cols = [col for col in numeric_cols if col not in ['year']]
-    
     if not numeric_cols:
         st.error("数据中没有找到数值指标列")
         return
     
     # 获取年份信息
     if 'year' in df.columns:
-        years = sorted(df['year'].unique())
         min_year = min(years) if years else 2000
         max_year = max(years) if years else 2023
     else:
@@ -201,49 +538,23 @@ def main():
             latest_year = max_year
             prev_year = latest_year - 1 if latest_year - 1 in years else years[-2] if len(years) > 1 else latest_year
             
-            latest_value = df[df['year'] == latest_year][main_metric].mean() if not df[df['year'] == latest_year].empty else 0
-            prev_value = df[df['year'] == prev_year][main_metric].mean() if not df[df['year'] == prev_year].empty else 0
+            latest_value = agg_year.at[latest_year, (main_metric, 'mean')] if latest_year in agg_year.index else 0
+            prev_value = agg_year.at[prev_year, (main_metric, 'mean')] if prev_year in agg_year.index else 0
             
             growth = ((latest_value - prev_value) / prev_value * 100) if prev_value != 0 else 0
             
-            col1, col2, col3, col4 = st.columns(4)
-            
-            with col1:
-                st.markdown(f"""
-                <div class="metric-card">
-                    <div style="font-size: 0.9rem; color: #a0a0c0;">当前年份数值</div>
-                    <div style="font-size: 1.8rem; color: #ffffff; font-weight: bold;">{latest_value:,.0f}</div>
-                    <div style="font-size: 0.8rem; color: #a0a0c0;">{main_metric} ({latest_year})</div>
-                </div>
-                """, unsafe_allow_html=True)
-            
-            with col2:
-                growth_color = '#00ff00' if growth > 0 else '#ff4444'
-                st.markdown(f"""
-                <div class="metric-card">
-                    <div style="font-size: 0.9rem; color: #a0a0c0;">年度增长率</div>
-                    <div style="font-size: 1.8rem; color: {growth_color}; font-weight: bold;">{growth:+.1f}%</div>
-                    <div style="font-size: 0.8rem; color: #a0a0c0;">相比{prev_year}年</div>
-                </div>
-                """, unsafe_allow_html=True)
-            
-            with col3:
-                st.markdown(f"""
-                <div class="metric-card">
-                    <div style="font-size: 0.9rem; color: #a0a0c0;">数据时间范围</div>
-                    <div style="font-size: 1.5rem; color: #ffffff; font-weight: bold;">{min_year}-{max_year}</div>
-                    <div style="font-size: 0.8rem; color: #a0a0c0;">共{len(years)}年</div>
-                </div>
-                """, unsafe_allow_html=True)
-            
-            with col4:
-                st.markdown(f"""
-                <div class="metric-card">
-                    <div style="font-size: 0.9rem; color: #a0a0c0;">可用指标数量</div>
-                    <div style="font-size: 1.8rem; color: #ffffff; font-weight: bold;">{len(numeric_cols)}</div>
-                    <div style="font-size: 0.8rem; color: #a0a0c0;">经济指标</div>
-                </div>
-                """, unsafe_allow_html=True)
+            # 四张指标卡片的参数放在一起，用一次st.columns(4)循环渲染
+            metric_cards = [
+                dict(label=f"当前年份数值（{main_metric}, {latest_year}）",
+                     value=f"{latest_value:,.0f}", delta=f"{growth:+.1f}%"),
+                # 涨跌颜色交给st.metric根据delta正负自动处理
+                dict(label="年度增长率", value=f"{growth:+.1f}%",
+                     delta=f"{latest_value - prev_value:+,.0f}", help=f"相比{prev_year}年"),
+                dict(label="数据时间范围", value=f"{min_year}-{max_year}", help=f"共{len(years)}年"),
+                dict(label="可用指标数量", value=len(numeric_cols), help="经济指标"),
+            ]
+            for col, card in zip(st.columns(4), metric_cards):
+                col.metric(**card)
     
     st.markdown("---")
     
@@ -342,59 +653,36 @@ def main():
     with col_chart:
         st.markdown('<div class="chart-card">', unsafe_allow_html=True)
         
-        # 根据图表类型生成对应的图表
+        # 根据图表类型生成对应的图表（图表按配置缓存，配置未变时直接复用）
+        colors = color_sequence
+        
+        # 本次图表配置的指纹；与上次运行相同（例如只改了无关控件）时直接复用上次的图表，
+        # 连缓存键的哈希计算都省掉。只保留最近一次的图表，其余交给st.cache_data
+        fig_key = (
+            chart_type, tuple(selected_metrics), tuple(year_range), selected_metric,
+            tuple(comparison_years), num_years, x_metric, y_metric, color_by,
+            color_scheme, show_grid, show_legend, unified_hover
+        )
+        if 'fig_cache' not in st.session_state:
+            st.session_state.fig_cache = {}
+        
+        def get_fig(build, *args):
+            """按配置指纹取图表，指纹变化时才重新构建"""
+            fig_cache = st.session_state.fig_cache
+            if fig_key not in fig_cache:
+                st.session_state.fig_cache = fig_cache = {fig_key: build(*args)}
+            return fig_cache[fig_key]
+        
         if chart_type == "时间序列趋势图":
             st.subheader("📈 时间序列趋势分析")
             
             if selected_metrics and len(selected_metrics) > 0:
-                # 筛选数据
-                filtered_df = df[(df['year'] >= year_range[0]) & (df['year'] <= year_range[1])]
+                fig = get_fig(
+                    build_timeseries_fig, agg_year, tuple(selected_metrics), tuple(year_range), colors,
+                    show_grid, show_legend, unified_hover
+                )
                 
-                if not filtered_df.empty:
-                    fig = go.Figure()
-                    
-                    for i, metric in enumerate(selected_metrics):
-                        # 按年份聚合数据
-                        yearly_avg = filtered_df.groupby('year')[metric].mean().reset_index()
-                        
-                        fig.add_trace(go.Scatter(
-                            x=yearly_avg['year'],
-                            y=yearly_avg[metric],
-                            mode='lines+markers',
-                            name=metric,
-                            line=dict(width=3, color=color_sequence[i % len(color_sequence)]),
-                            marker=dict(size=6)
-                        ))
-                    
-                    # 更新布局
-                    fig.update_layout(
-                        title=f"{year_range[0]}-{year_range[1]}年趋势分析",
-                        xaxis_title="年份",
-                        yaxis_title="数值",
-                        showlegend=show_legend,
-                        plot_bgcolor='#1e2130',
-                        paper_bgcolor='#1e2130',
-                        font=dict(color='white'),
-                        hovermode='x unified'
-                    )
-                    
-                    if show_grid:
-                        fig.update_xaxes(
-                            showgrid=True, 
-                            gridwidth=1, 
-                            gridcolor='#3a3a4a',
-                            zerolinecolor='#3a3a4a'
-                        )
-                        fig.update_yaxes(
-                            showgrid=True, 
-                            gridwidth=1, 
-                            gridcolor='#3a3a4a',
-                            zerolinecolor='#3a3a4a'
-                        )
-                    else:
-                        fig.update_xaxes(showgrid=False, zeroline=False)
-                        fig.update_yaxes(showgrid=False, zeroline=False)
-                    
+                if fig is not None:
                     st.plotly_chart(fig, use_container_width=True)
                 else:
                     st.warning("所选年份范围内无数据")
@@ -405,56 +693,12 @@ def main():
             st.subheader("📊 年度对比分析")
             
             if selected_metric and comparison_years and len(comparison_years) > 0:
-                # 筛选数据
-                comparison_data = []
-                for year in comparison_years:
-                    year_data = df[df['year'] == year]
-                    if not year_data.empty:
-                        avg_value = year_data[selected_metric].mean()
-                        comparison_data.append({
-                            '年份': str(year),
-                            '数值': avg_value
-                        })
+                fig = get_fig(
+                    build_bar_fig, agg_year, selected_metric, tuple(comparison_years), colors,
+                    show_grid, show_legend
+                )
                 
-                if comparison_data:
-                    comp_df = pd.DataFrame(comparison_data)
-                    
-                    fig = px.bar(
-                        comp_df,
-                        x='年份',
-                        y='数值',
-                        color='年份',
-                        title=f"{selected_metric} 年度对比",
-                        color_discrete_sequence=color_sequence,
-                        text='数值'
-                    )
-                    
-                    fig.update_traces(
-                        texttemplate='%{text:,.0f}',
-                        textposition='outside',
-                        marker_line_width=1,
-                        marker_line_color='white'
-                    )
-                    
-                    fig.update_layout(
-                        plot_bgcolor='#1e2130',
-                        paper_bgcolor='#1e2130',
-                        font=dict(color='white'),
-                        showlegend=show_legend
-                    )
-                    
-                    if show_grid:
-                        fig.update_xaxes(
-                            showgrid=True, 
-                            gridwidth=1, 
-                            gridcolor='#3a3a4a'
-                        )
-                        fig.update_yaxes(
-                            showgrid=True, 
-                            gridwidth=1, 
-                            gridcolor='#3a3a4a'
-                        )
-                    
+                if fig is not None:
                     st.plotly_chart(fig, use_container_width=True)
                 else:
                     st.warning("所选年份无数据")
@@ -467,46 +711,11 @@ def main():
             if selected_metric:
                 # 获取最近N年的数据
                 recent_years = sorted(years, reverse=True)[:num_years]
-                pie_data = []
-                
-                for year in recent_years:
-                    year_data = df[df['year'] == year]
-                    if not year_data.empty:
-                        total_value = year_data[selected_metric].sum()
-                        pie_data.append({
-                            '年份': str(year),
-                            '数值': total_value
-                        })
+                fig = get_fig(
+                    build_pie_fig, agg_year, selected_metric, tuple(recent_years), num_years, colors, show_legend
+                )
                 
-                if pie_data and len(pie_data) > 1:
-                    pie_df = pd.DataFrame(pie_data)
-                    
-                    fig = px.pie(
-                        pie_df,
-                        values='数值',
-                        names='年份',
-                        title=f"{selected_metric} - 最近{num_years}年占比分布",
-                        color_discrete_sequence=color_sequence,
-                        hole=0.3  # 环形图
-                    )
-                    
-                    fig.update_traces(
-                        textposition='inside',
-                        textinfo='percent+label',
-                        textfont_size=14,
-                        marker=dict(line=dict(color='white', width=2))
-                    )
-                    
-                    fig.update_layout(
-                        plot_bgcolor='#1e2130',
-                        paper_bgcolor='#1e2130',
-                        font=dict(color='white'),
-                        showlegend=show_legend,
-                        legend=dict(
-                            font=dict(size=12, color='white')
-                        )
-                    )
-                    
+                if fig is not None:
                     st.plotly_chart(fig, use_container_width=True)
                 else:
                     st.warning("需要至少2年的数据来生成饼图")
@@ -516,53 +725,17 @@ def main():
             
             if selected_metric:
                 try:
-                    # 准备数据
                     start_year, end_year = year_range
-                    heatmap_years = list(range(start_year, end_year + 1))
                     
                     # 检查是否有足够的年份数据
-                    if len(heatmap_years) < 2:
+                    if end_year - start_year + 1 < 2:
                         st.warning("需要至少2年的数据来生成热力图")
                         st.markdown('</div>', unsafe_allow_html=True)
                         return
                     
-                    # 创建热力图数据
-                    heatmap_data = []
-                    available_years = df['year'].unique()
+                    fig = get_fig(build_heatmap_fig, agg_year, selected_metric, start_year, end_year, colors)
                     
-                    for year in heatmap_years:
-                        if year in available_years:
-                            year_data = df[df['year'] == year]
-                            if not year_data.empty:
-                                # 使用4个季度或月份的数据
-                                for period in range(1, 5):  # 假设4个季度
-                                    # 这里简化处理，实际应用中可能需要真实的季度数据
-                                    value = year_data[selected_metric].mean() * (0.8 + 0.2 * (period/4))
-                                    heatmap_data.append({
-                                        '年份': year,
-                                        '时期': f'Q{period}',
-                                        '数值': value
-                                    })
-                    
-                    if heatmap_data:
-                        heatmap_df = pd.DataFrame(heatmap_data)
-                        
-                        fig = px.density_heatmap(
-                            heatmap_df,
-                            x='时期',
-                            y='年份',
-                            z='数值',
-                            title=f"{selected_metric} - {start_year}-{end_year}年热力图",
-                            color_continuous_scale=color_sequence,
-                            text_auto='.0f'
-                        )
-                        
-                        fig.update_layout(
-                            plot_bgcolor='#1e2130',
-                            paper_bgcolor='#1e2130',
-                            font=dict(color='white')
-                        )
-                        
+                    if fig is not None:
                         st.plotly_chart(fig, use_container_width=True)
                     else:
                         st.warning("无法生成热力图数据")
@@ -574,87 +747,28 @@ def main():
             
             if x_metric and y_metric and x_metric != y_metric:
                 try:
-                    scatter_df = df.copy()
-                    
                     # 确保有数据
-                    if scatter_df.empty or x_metric not in scatter_df.columns or y_metric not in scatter_df.columns:
+                    if df.empty or x_metric not in df.columns or y_metric not in df.columns:
                         st.warning("数据不完整，无法生成散点图")
                         st.markdown('</div>', unsafe_allow_html=True)
                         return
                     
-                    # 移除缺失值
-                    scatter_df = scatter_df[[x_metric, y_metric, 'year_str']].dropna()
+                    # 只取需要的列再移除缺失值，不再复制整张表
+                    scatter_df = df[[x_metric, y_metric, 'year']].dropna()
                     
                     if len(scatter_df) < 2:
                         st.warning("数据点不足，无法生成散点图")
                         st.markdown('</div>', unsafe_allow_html=True)
                         return
                     
-                    if color_by == "无":
-                        fig = px.scatter(
-                            scatter_df,
-                            x=x_metric,
-                            y=y_metric,
-                            title=f"{x_metric} vs {y_metric} 相关性分析",
-                            trendline="ols",
-                            color_discrete_sequence=[color_sequence[0]]
-                        )
-                    elif color_by == "年份":
-                        fig = px.scatter(
-                            scatter_df,
-                            x=x_metric,
-                            y=y_metric,
-                            color='year_str',
-                            title=f"{x_metric} vs {y_metric} 相关性分析（按年份）",
-                            trendline="ols",
-                            color_discrete_sequence=color_sequence
-                        )
-                    else:
-                        if color_by in scatter_df.columns:
-                            fig = px.scatter(
-                                scatter_df,
-                                x=x_metric,
-                                y=y_metric,
-                                color=color_by,
-                                title=f"{x_metric} vs {y_metric} 相关性分析（按{color_by}）",
-                                trendline="ols",
-                                color_continuous_scale=color_sequence
-                            )
-                        else:
-                            st.warning(f"颜色分组列 '{color_by}' 不存在")
-                            color_by = "无"
-                            fig = px.scatter(
-                                scatter_df,
-                                x=x_metric,
-                                y=y_metric,
-                                title=f"{x_metric} vs {y_metric} 相关性分析",
-                                trendline="ols",
-                                color_discrete_sequence=[color_sequence[0]]
-                            )
-                    
-                    # 计算相关系数
-                    correlation = scatter_df[x_metric].corr(scatter_df[y_metric])
+                    if color_by not in ["无", "年份"] and color_by not in scatter_df.columns:
+                        st.warning(f"颜色分组列 '{color_by}' 不存在")
+                        color_by = "无"
                     
-                    fig.update_layout(
-                        plot_bgcolor='#1e2130',
-                        paper_bgcolor='#1e2130',
-                        font=dict(color='white'),
-                        showlegend=show_legend,
-                        title=f"{fig.layout.title.text}<br><sup>相关系数: {correlation:.3f}</sup>"
+                    fig = get_fig(
+                        build_scatter_fig, scatter_df, x_metric, y_metric, color_by, colors, show_grid, show_legend
                     )
                     
-                    if show_grid:
-                        fig.update_xaxes(
-                            showgrid=True, 
-                            gridwidth=1, 
-                            gridcolor='#3a3a4a'
-                        )
-                        fig.update_yaxes(
-                            showgrid=True, 
-                            gridwidth=1, 
-                            gridcolor='#3a3a4a'
-                        )
-                    
                     st.plotly_chart(fig, use_container_width=True)
                 except Exception as e:
                     st.error(f"生成散点图时出错: {str(e)}")
@@ -665,49 +779,12 @@ def main():
             st.subheader("📊 堆叠面积图")
             
             if selected_metrics and len(selected_metrics) > 0:
-                filtered_df = df[(df['year'] >= year_range[0]) & (df['year'] <= year_range[1])]
+                fig = get_fig(
+                    build_stacked_area_fig, agg_year, tuple(selected_metrics), tuple(year_range), colors,
+                    show_grid, show_legend, unified_hover
+                )
                 
-                if not filtered_df.empty:
-                    fig = go.Figure()
-                    
-                    # 为堆叠面积图准备数据
-                    for i, metric in enumerate(selected_metrics):
-                        # 按年份聚合
-                        yearly_avg = filtered_df.groupby('year')[metric].mean().reset_index()
-                        
-                        fig.add_trace(go.Scatter(
-                            x=yearly_avg['year'],
-                            y=yearly_avg[metric],
-                            mode='lines',
-                            name=metric,
-                            stackgroup='one',  # 关键参数：堆叠
-                            line=dict(width=0.5, color=color_sequence[i % len(color_sequence)]),
-                            fillcolor=color_sequence[i % len(color_sequence)]
-                        ))
-                    
-                    fig.update_layout(
-                        title=f"{year_range[0]}-{year_range[1]}年指标堆叠分布",
-                        xaxis_title="年份",
-                        yaxis_title="数值",
-                        showlegend=show_legend,
-                        plot_bgcolor='#1e2130',
-                        paper_bgcolor='#1e2130',
-                        font=dict(color='white'),
-                        hovermode='x unified'
-                    )
-                    
-                    if show_grid:
-                        fig.update_xaxes(
-                            showgrid=True, 
-                            gridwidth=1, 
-                            gridcolor='#3a3a4a'
-                        )
-                        fig.update_yaxes(
-                            showgrid=True, 
-                            gridwidth=1, 
-                            gridcolor='#3a3a4a'
-                        )
-                    
+                if fig is not None:
                     st.plotly_chart(fig, use_container_width=True)
                 else:
                     st.warning("所选年份范围内无数据")